@@ -0,0 +1,141 @@
+r"""
+Dense Fourier-Motzkin kernels on ``float64`` coefficient matrices
+
+These are used by ``BasicSemialgebraicSet_polyhedral_linear_system`` when the
+base ring is ``RDF``.  The rows of the matrices are the coefficient vectors
+of linear polynomials, with the constant term in the last column.
+
+If numba is available, the kernels are compiled; otherwise the same
+computation is done by NumPy broadcasting.
+
+EXAMPLES::
+
+    sage: from cutgeneratingfunctionology.spam._fm_kernels import fm_combine, normalize_rows
+    sage: import numpy as np
+    sage: L = np.array([[-1., 1., 0.], [-2., 0., 1.]])
+    sage: U = np.array([[1., 1., -4.]])
+    sage: rows = fm_combine(L, U, 0)
+    sage: rows
+    array([[ 0.,  2., -4.],
+           [ 0.,  2., -7.]])
+    sage: out = np.empty((2, 3))
+    sage: fm_combine(L, U, 0, out) is out
+    True
+    sage: normalize_rows(rows)
+    array([[ 0. ,  1. , -2. ],
+           [ 0. ,  1. , -3.5]])
+
+The NumPy versions, which are used when numba is not available, give the
+same results as the kernels in use::
+
+    sage: from cutgeneratingfunctionology.spam._fm_kernels import _fm_combine_numpy, _normalize_rows_numpy
+    sage: L = np.arange(28, dtype=float).reshape(7, 4) % 11 - 5
+    sage: L[:, 2] = -np.arange(1, 8)
+    sage: U = np.arange(20, dtype=float).reshape(5, 4) % 7 - 3
+    sage: U[:, 2] = np.arange(1, 6)
+    sage: out = np.empty((35, 4))
+    sage: _fm_combine_numpy(L, U, 2, out)
+    sage: np.array_equal(out, fm_combine(L, U, 2))
+    True
+    sage: np.array_equal(_normalize_rows_numpy(out), normalize_rows(out))
+    True
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+def _fm_combine_loops(L, U, coord, rows):
+    r"""
+    Loop version of ``fm_combine``, to be compiled by numba.
+    """
+    n_lower = L.shape[0]
+    n_upper = U.shape[0]
+    m = L.shape[1]
+    for i in prange(n_lower):
+        l_c = L[i, coord]
+        for j in range(n_upper):
+            u_c = U[j, coord]
+            k = i * n_upper + j
+            for t in range(m):
+                rows[k, t] = L[i, t] * u_c - U[j, t] * l_c
+            rows[k, coord] = 0.0
+
+def _normalize_rows_loops(rows):
+    r"""
+    Loop version of ``normalize_rows``, to be compiled by numba.
+    """
+    m = rows.shape[1]
+    result = np.empty_like(rows)
+    for k in prange(rows.shape[0]):
+        pivot = rows[k, m - 1]
+        for t in range(m - 1):
+            if rows[k, t] != 0.0:
+                pivot = rows[k, t]
+                break
+        pivot = abs(pivot)
+        if pivot == 0.0:
+            pivot = 1.0
+        for t in range(m):
+            result[k, t] = rows[k, t] / pivot
+    return result
+
+def _fm_combine_numpy(L, U, coord, rows):
+    r"""
+    NumPy version of ``fm_combine``.
+    """
+    view = rows.reshape(L.shape[0], U.shape[0], L.shape[1])
+    np.multiply(L[:, None, :], U[None, :, coord, None], out=view)
+    view -= U[None, :, :] * L[:, None, coord, None]
+    view[:, :, coord] = 0.0
+
+def _normalize_rows_numpy(rows):
+    r"""
+    NumPy version of ``normalize_rows``.
+    """
+    linear = rows[:, :-1]
+    nonzero = linear != 0
+    first = nonzero.argmax(axis=1)
+    pivot = np.where(nonzero.any(axis=1), linear[np.arange(rows.shape[0]), first], rows[:, -1])
+    pivot = np.abs(pivot)
+    pivot[pivot == 0] = 1.0
+    return rows / pivot[:, None]
+
+# fastmath is not used, so that the results agree with the (uncompiled)
+# exactly rounded computation of ``_normalize_linear``; otherwise dedup
+# keys of equal inequalities could differ.
+if njit is not None:
+    _fm_combine = njit(parallel=True, cache=True)(_fm_combine_loops)
+    _normalize_rows = njit(parallel=True, cache=True)(_normalize_rows_loops)
+else:
+    _fm_combine = _fm_combine_numpy
+    _normalize_rows = _normalize_rows_numpy
+
+def fm_combine(L, U, coord, out=None):
+    r"""
+    Return the matrix whose row ``i * U.shape[0] + j`` is the Fourier-Motzkin
+    combination ``L[i] * U[j, coord] - U[j] * L[i, coord]``, with the column
+    ``coord`` set to zero.
+
+    If given, ``out`` is a C-contiguous ``float64`` matrix of the right shape
+    (for example, a slice of rows of a larger buffer), which is filled and returned.
+    """
+    L = np.ascontiguousarray(L, dtype=np.float64)
+    U = np.ascontiguousarray(U, dtype=np.float64)
+    if out is None:
+        out = np.empty((L.shape[0] * U.shape[0], L.shape[1]))
+    _fm_combine(L, U, int(coord), out)
+    return out
+
+def normalize_rows(rows):
+    r"""
+    Return ``rows`` with each row divided by the absolute value of its first
+    nonzero linear coefficient (or else of its constant term, if nonzero).
+    """
+    return _normalize_rows(np.ascontiguousarray(rows, dtype=np.float64))
@@ -4,14 +4,27 @@ Basic polyhedral semialgebraic sets represented as linear systems
 
 from __future__ import division, print_function, absolute_import
 
-from cutgeneratingfunctionology.spam.basic_semialgebraic import BasicSemialgebraicSet_base, BasicSemialgebraicSet_polyhedral
+from cutgeneratingfunctionology.spam.basic_semialgebraic import BasicSemialgebraicSet_base, BasicSemialgebraicSet_polyhedral, _bsa_class
+from cutgeneratingfunctionology.spam._fm_kernels import fm_combine, normalize_rows
 from sage.rings.polynomial.polynomial_ring_constructor import PolynomialRing
+from sage.rings.all import QQ
+from sage.rings.real_double import RDF
 from sage.geometry.polyhedron.all import *
 import sage.structure.element
+from itertools import chain, product
 import operator
+import numpy as np
 
 cm = sage.structure.element.get_coercion_model()
 
+# Base rings whose coefficients can be handled as dense NumPy arrays
+# in the Fourier-Motzkin elimination.
+_dense_base_rings = (QQ, RDF)
+
+# The constraint lhs op 0 is stored as sign*lhs in the set of the given attribute.
+_op_to_set = {operator.lt: ('_lt', 1), operator.gt: ('_lt', -1), operator.eq: ('_eq', 1),
+              operator.le: ('_le', 1), operator.ge: ('_le', -1)}
+
 # Implement by rewriting code from formulations.sage on branch symbolic_FM. (FourierSystem, ...)
 
 class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyhedral):
@@ -24,10 +37,15 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
     Also it is suitable for arbitrary real fields as the ``base_ring``, such as ``ParametricRealField``.
     """
 
-    def __init__(self, base_ring=None, ambient_dim=None, poly_ring=None, eq=[], lt=[], le=[], history_set=None):
+    def __init__(self, base_ring=None, ambient_dim=None, poly_ring=None, eq=[], lt=[], le=[], history_set=None, _precomputed_matrices=None, _precomputed_keys=None):
         r"""
         Initialize a closed polyhedral basic semialgebraic set.
 
+        The private arguments ``_precomputed_matrices`` and ``_precomputed_keys``
+        are triples of sequences of coefficient rows (see ``_matrix_view``) and of
+        keys (see ``_constraint_key``), aligned with ``eq``, ``lt`` and ``le``;
+        entries may be ``None``.
+
         EXAMPLES::
 
             sage: import cutgeneratingfunctionology.igp as igp; from cutgeneratingfunctionology.igp import *
@@ -88,7 +106,8 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
         for e in polys:
             if e.degree()>1:
                 raise ValueError("only suitable for linear system.")
-        if len(polys)>0:
+        # the coercion model is only needed if some polynomial has another parent.
+        if len(polys)>0 and not all(e.parent() is poly_ring for e in polys):
             proper_poly_ring = cm.common_parent(*polys)
             if poly_ring != proper_poly_ring:
                 raise ValueError("not a proper poly_ring.")
@@ -96,71 +115,154 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
             ambient_dim = poly_ring.ngens()
         if base_ring is None:
             base_ring = poly_ring.base_ring()
+        super(BasicSemialgebraicSet_polyhedral_linear_system, self).__init__(base_ring, ambient_dim)
+        self._poly_ring = poly_ring
+        self._gens = poly_ring.gens()
+        self._gens_index = {g: i for i, g in enumerate(self._gens)}
+        # the exponents, as keys of dict(), of the monomials 1, x0, x1, ...
+        self._exponents = [next(iter(m.dict())) for m in (poly_ring.one(),) + self._gens]
+        self._exponents_index = {e: i for i, e in enumerate(self._exponents)}
+        # the (in)equalities are stored in insertion order, keyed by _constraint_key.
+        self._eq = {}
+        self._lt = {}
+        self._le = {}
+        # Whether history_set has a history set for each constraint.  Only then is
+        # remove_redundancy_non_minimal_history_set valid; otherwise, it can drop a
+        # constraint that stands in for one that shares its history set.
+        self._history_set_is_exact = True
+        # coefficient rows of the polynomials, memoized by ``_matrix_view``.
+        self._coeff_rows = {}
+        if _precomputed_matrices is not None:
+            for family, rows in zip((eq, lt, le), _precomputed_matrices):
+                for p, row in zip(family, rows):
+                    if row is not None:
+                        self._coeff_rows[p] = row
+        if _precomputed_keys is None:
+            _precomputed_keys = ((), (), ())
+        dense = base_ring in _dense_base_rings
+        dropped = []
+        for family, family_polys, family_keys in zip((self._eq, self._lt, self._le), (eq, lt, le), _precomputed_keys):
+            family_polys = list(family_polys)
+            family_keys = list(family_keys) + [None] * (len(family_polys) - len(family_keys))
+            for p, key in zip(family_polys, family_keys):
+                if key is None:
+                    key = self._constraint_key(p)
+                q = family.setdefault(key, p)
+                if dense and history_set is not None and q is not p and q != p:
+                    # p is a positive multiple of q, which is kept.
+                    dropped.append(p)
+        for key in list(self._le):
+            if key in self._eq or key in self._lt:
+                # implied by the same equation or strict inequality.
+                p = self._le.pop(key)
+                if history_set is not None:
+                    dropped.append(p)
+        if dropped:
+            # p may still be kept in another family.
+            kept = set(chain(self._eq.values(), self._lt.values(), self._le.values()))
+            for p in dropped:
+                if p not in kept:
+                    history_set.pop(p, None)
+        if len(set(chain(self._eq.values(), self._lt.values()))) < len(self._eq) + len(self._lt):
+            # a polynomial in several families has only one history set.
+            self._history_set_is_exact = False
         if history_set is None:
             history_set={}
             i=1
-            for p in polys:
+            for p in chain(self._eq.values(), self._lt.values(), self._le.values()):
                 history_set[p]={i}
                 i+=1
-        super(BasicSemialgebraicSet_polyhedral_linear_system, self).__init__(base_ring, ambient_dim)
-        self._poly_ring = poly_ring
         self.history_set = history_set
-        self._eq = set(eq)
-        self._lt = set(lt)
-        self._le = set(le)
 
     def remove_redundant_constant_polynomial(self):
         r"""
         Remove redundent constant polynomial or use constant polynomial to check naive infeasibility.
         If the linear system is infeasible, return a system with one inequality 1<=0.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, eq=[Q(0)], lt=[x-y, Q(-1)], le=[y])
+            sage: bsa.remove_redundant_constant_polynomial()
+            sage: bsa.eq_poly(), bsa.lt_poly(), bsa.le_poly()
+            (set(), {x - y}, {y})
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, lt=[x-y, Q(0)], le=[y])
+            sage: bsa.remove_redundant_constant_polynomial()
+            sage: bsa.eq_poly(), bsa.lt_poly(), bsa.le_poly()
+            (set(), set(), {1})
         """
-        temp_eq = self._eq.copy()
-        temp_lt = self._lt.copy()
-        temp_le = self._le.copy()
-        for e in self._eq:
-            if e.degree()<1:
-                if self._base_ring(e) != self._base_ring(0):
-                    #replace with an invalid inequality.
-                    self._le={poly_ring(1)}
-                    self._eq={}
-                    self._lt={}
-                    self.history_set={poly_ring(1):1}
-                    return
-                else:
-                    temp_eq.remove(e)
-                    if e in self.history_set:
-                        del self.history_set[e]
-        for lt in self._lt:
-            if lt.degree()<1:
-                if self._base_ring(lt) >= self._base_ring(0):
-                    self._le={poly_ring(1)}
-                    self._eq={}
-                    self._lt={}
-                    self.history_set={poly_ring(1):1}
-                    return
-                else:
-                    temp_lt.remove(lt)
-                    if lt in self.history_set:
-                        del self.history_set[lt]
-        for le in self._le:
-            if le.degree()<1:
-                if self._base_ring(le) > self._base_ring(0):
-                    self._le={poly_ring(1)}
-                    self._eq={}
-                    self._lt={}
-                    self.history_set={poly_ring(1):1}
-                    return
+        base_ring = self._base_ring
+        zero = base_ring(0)
+
+        def nonconstant_polynomials(polys, infeasible):
+            # Return the dictionary of non-constant polynomials of polys,
+            # or None if infeasible(value) holds for a constant one.
+            result = {}
+            for key, p in polys.items():
+                if p.degree() < 1:
+                    if infeasible(base_ring(p)):
+                        return None
+                    self.history_set.pop(p, None)
                 else:
-                    temp_le.remove(le)
-                    if le in self.history_set:
-                        del self.history_set[le]
-        self._le=temp_le
-        self._eq=temp_eq
-        self._lt=temp_lt
+                    result[key] = p
+            return result
+
+        eq = nonconstant_polynomials(self._eq, lambda v: v != zero)
+        lt = nonconstant_polynomials(self._lt, lambda v: v >= zero) if eq is not None else None
+        le = nonconstant_polynomials(self._le, lambda v: v > zero) if lt is not None else None
+        if le is None:
+            #replace with an invalid inequality.
+            one = self._poly_ring(1)
+            self._le = {self._constraint_key(one): one}
+            self._eq = {}
+            self._lt = {}
+            self.history_set = {one: set()}
+            return
+        self._eq = eq
+        self._lt = lt
+        self._le = le
 
     def remove_redundancy_non_minimal_history_set(self):
         r"""
         Remove redundant (in)equality if the history set of the (in)equality is not minimal.
+
+        This is only valid if no constraint was dropped in favor of one with a history set
+        that is not contained in its own, other than a positive multiple of it;
+        ``one_step_elimination`` only calls it in this case.
+
+        EXAMPLES:
+
+        The following system is empty.  In its projection, some inequalities are dominated
+        by inequalities with other history sets, which are then not used::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x0,x1,x2,x3,x4> = QQ[]
+            sage: le = [2*x1-2*x2-x3+x4-4, -2*x0+2*x1-2*x2-2*x3-2*x4+2, 2*x0-3*x2-3*x3+3*x4+2,
+            ....:       -2*x1-2*x2+2*x3-x4-5, -3*x0+3*x1+x2+3*x3+3*x4+1, -2*x0-x1-3*x2+2*x3-3*x4+1,
+            ....:       -x0-3*x1-3*x3+2*x4-3, 2*x0-2*x1-x3-3*x4+2, 3*x0+x1+2*x2-x3+x4-2]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=le)
+            sage: Polyhedron(ieqs=[[-p.constant_coefficient()] + [-p.monomial_coefficient(x) for x in Q.gens()] for p in le]).is_empty()
+            True
+            sage: bsa.coordinate_projection([x0, x1, x2, x3], strategy='input_order').to_polyhedron().is_empty()
+            True
+            sage: bsa.coordinate_projection([x0, x1, x2, x3], strategy='greedy').to_polyhedron().is_empty()
+            True
+
+        The history sets stay usable along a projection, so that the number of
+        inequalities stays small::
+
+            sage: Q.<x0,x1,x2,x3,x4,x5> = QQ[]
+            sage: lt = [-x0-x1-3*x2+x3+3*x4+x5+4, -2*x0-2*x1-x2-2*x3+2*x4-x5+1, -6*x0+6*x1-6*x3-6*x4-4*x5-2]
+            sage: le = [-3*x0+3*x1-3*x3-3*x4-2*x5-1, x0+x1-2*x2+2*x5-3, -3*x0-2*x1+2*x3-3*x4+3*x5,
+            ....:       -x0+x1+2*x2+2*x3-2*x4-3*x5+4, -2*x0-3*x1-x2-2*x3-x4-x5-4, -3*x0-x1+x2+x3-x5+2,
+            ....:       x0+2*x2-3*x3-2*x4-3*x5+1, x0+3*x1-2*x2+x3+3*x5-4, -2*x0+x1+3*x2-x3+2*x5-3, 2*x0+x1+2*x2-x3+x5+3]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, lt=lt, le=le)
+            sage: bsa_proj = bsa.coordinate_projection([x1, x0, x2, x3])
+            sage: bsa_proj._history_set_is_exact
+            True
+            sage: len(bsa_proj.lt_poly()) + len(bsa_proj.le_poly()) <= 44
+            True
         """
         history_set = self.history_set.copy()
         for key1 in history_set.keys():
@@ -169,141 +271,628 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
                     continue
                 if history_set[key2].issubset(history_set[key1]) and history_set[key1] != history_set[key2]:
                     # remove key1
-                    self.history_set.discard(key1)
-                    self._le.discard(key1)
-                    self._lt.discard(key1)
-                    self._eq.discard(key1)
+                    del self.history_set[key1]
+                    key = self._constraint_key(key1)
+                    for family in (self._le, self._lt, self._eq):
+                        if key in family and family[key] == key1:
+                            del family[key]
                     break
 
+    def _to_coeff_matrix(self, polys):
+        r"""
+        Return a pair ``(coeffs, const)`` of NumPy arrays, where the row ``i``
+        of ``coeffs`` holds the coefficients of ``polys[i]`` indexed by
+        ``self.poly_ring().gens()`` and ``const[i]`` is its constant term.
+
+        Only intended for the base rings in ``_dense_base_rings``.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=[x-1, 2*y+x])
+            sage: coeffs, const = bsa._to_coeff_matrix([x-1, 1/2*y+3])
+            sage: coeffs
+            array([[1, 0],
+                   [0, 1/2]], dtype=object)
+            sage: const
+            array([-1, 3], dtype=object)
+        """
+        dtype = np.float64 if self._base_ring is RDF else object
+        rows = np.array(self._coefficient_lists(polys), dtype=dtype).reshape(len(polys), self._poly_ring.ngens() + 1)
+        return rows[:, 1:], rows[:, 0]
+
+    def _from_coefficient_list(self, coefficients):
+        r"""
+        Return the linear polynomial with constant term and coefficients
+        ``coefficients = [const, c0, c1, ...]``, constructed at once from
+        a dictionary of its terms.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q)
+            sage: bsa._from_coefficient_list([-1, 0, 1/2])
+            1/2*y - 1
+        """
+        return self._poly_ring({e: c for e, c in zip(self._exponents, coefficients) if c})
+
+    def _coefficient_lists(self, polys):
+        r"""
+        Return the list of the lists ``[const, c0, c1, ...]`` of the constant term
+        and the coefficients (indexed by ``self.poly_ring().gens()``) of the
+        linear polynomials ``polys``.
+
+        Each polynomial is read from a single call to its ``dict`` method.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q)
+            sage: bsa._coefficient_lists([x-1, 1/2*y, Q(2)])
+            [[-1, 1, 0], [0, 0, 1/2], [2, 0, 0]]
+        """
+        index = self._exponents_index
+        zero = self._base_ring.zero()
+        result = []
+        for p in polys:
+            row = [zero] * len(self._exponents)
+            for exponent, c in p.dict().items():
+                row[index[exponent]] = c
+            result.append(row)
+        return result
+
+    def _matrix_view(self, polys):
+        r"""
+        Return the NumPy matrix whose row ``i`` is the coefficient vector
+        ``[c0, ..., c_{n-1}, const]`` of ``polys[i]``.
+
+        The rows are memoized, and may have been passed by
+        ``one_step_elimination``, so that the polynomials of a projection
+        are not parsed again into coefficients at the next step.
+
+        Only intended for the base rings in ``_dense_base_rings``.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=[x-1, 2*y+x])
+            sage: bsa._matrix_view([x-1, 1/2*y+3])
+            array([[1, 0, -1],
+                   [0, 1/2, 3]], dtype=object)
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=[x-1, y-x])
+            sage: bsa.one_step_elimination(0)._coeff_rows
+            {y - 1: array([1, -1], dtype=object)}
+        """
+        rows = self._coeff_rows
+        missing = [p for p in polys if p not in rows]
+        if missing:
+            for p, row in zip(missing, np.column_stack(self._to_coeff_matrix(missing))):
+                rows[p] = row
+        if not polys:
+            return np.column_stack(self._to_coeff_matrix([]))
+        return np.vstack([rows[p] for p in polys])
+
+    def _from_coeff_row(self, coeffs, const):
+        r"""
+        Return the linear polynomial of ``self.poly_ring()`` with coefficients
+        ``coeffs`` (indexed by the generators) and constant term ``const``.
+        """
+        base_ring = self._base_ring
+        return self._from_coefficient_list([base_ring(c) for c in chain((const,), coeffs)])
+
+    def _constraint_key(self, poly):
+        r"""
+        Return the key of ``poly`` in the dictionaries of (in)equalities of ``self``.
+
+        Over the base rings in ``_dense_base_rings``, this is ``_normalize_linear(poly)``,
+        so that positive multiples of a constraint are stored once; it is computed from
+        the coefficient row of ``poly`` if it is memoized (see ``_matrix_view``).
+        Otherwise, such as for ``ParametricRealField``, it is ``poly`` itself.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=[x-y, 2*x-2*y, -x])
+            sage: sorted(bsa.le_poly())
+            [-x, x - y]
+            sage: sorted(bsa.history_set.values())
+            [{1}, {2}]
+        """
+        if self._base_ring in _dense_base_rings:
+            row = self._coeff_rows.get(poly)
+            if row is not None:
+                return self._normalize_row(row)
+            return self._normalize_linear(poly)
+        return poly
+
+    def _normalize_linear(self, poly):
+        r"""
+        Return a hashable tuple ``(const, c0, c1, ...)`` of the constant term and the
+        coefficients of the linear polynomial ``poly``, so that positive multiples
+        of ``poly`` give the same tuple.
+
+        If the base ring is one of ``_dense_base_rings``, the tuple is scaled so that
+        its first nonzero linear coefficient (or else the constant term) is `\pm 1`.
+        For other base rings, such as ``ParametricRealField``, where comparisons
+        would add assumptions, the coefficients are not scaled.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q)
+            sage: bsa._normalize_linear(-2*x + 3*y + 4)
+            (2, -1, 3/2)
+            sage: bsa._normalize_linear(-4*x + 6*y + 8) == bsa._normalize_linear(-2*x + 3*y + 4)
+            True
+            sage: bsa._normalize_linear(Q(-3))
+            (-1, 0, 0)
+        """
+        return self._normalize_coefficients(self._coefficient_lists([poly])[0])
+
+    def _normalize_row(self, row):
+        r"""
+        Return ``_normalize_linear`` of the polynomial with the coefficient row
+        ``row`` (see ``_matrix_view``), without converting it to a polynomial.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q)
+            sage: bsa._normalize_row(bsa._matrix_view([-2*x + 3*y + 4])[0])
+            (2, -1, 3/2)
+        """
+        return self._normalize_coefficients(chain(row[-1:].tolist(), row[:-1].tolist()))
+
+    def _normalize_coefficients(self, coefficients):
+        # the tuple of coefficients [const, c0, c1, ...], scaled as in _normalize_linear.
+        row = tuple(coefficients)
+        if self._base_ring not in _dense_base_rings:
+            return row
+        pivot = next((c for c in row[1:] if c), row[0])
+        if not pivot:
+            return row
+        pivot = abs(pivot)
+        return tuple(c / pivot for c in row)
+
+    def _fm_combine(self, blocks, coordinate_index):
+        r"""
+        Return the list of the Fourier-Motzkin combinations ``l*u_c - u*l_c``
+        for ``((l, l_c), (u, u_c))`` in ``product(lower, upper)``, for each pair
+        ``(lower, upper)`` in ``blocks``.  Here ``lower`` and ``upper`` are lists of
+        pairs of a polynomial ``p`` and the coefficient ``p_c`` of the
+        ``coordinate_index``-th generator in ``p``.
+
+        The combinations are returned as tuples ``(l, u, polynomial, key, row)``,
+        where ``key`` is either ``None`` or the tuple ``_normalize_linear(polynomial)``,
+        and ``row`` is either ``None`` or the coefficient row of ``polynomial``
+        (see ``_matrix_view``).
+
+        If the base ring is one of ``_dense_base_rings``, the combinations are
+        computed on NumPy coefficient matrices and written into one preallocated
+        matrix, using the kernels of ``_fm_kernels`` for ``RDF``; otherwise (for
+        example for ``ParametricRealField``) by polynomial arithmetic.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q)
+            sage: lower = [(-x + y, -1), (-2*x, -2)]
+            sage: upper = [(x - 1, 1)]
+            sage: [polynomial for _, _, polynomial, _, _ in bsa._fm_combine([(lower, upper), ([(-x - y, -1)], upper)], 0)]
+            [y - 1, -2, -y - 1]
+        """
+        pairs = [(l, u, l_c, u_c) for lower, upper in blocks for (l, l_c), (u, u_c) in product(lower, upper)]
+        if self._base_ring not in _dense_base_rings:
+            return [(l, u, l*u_c-(u*l_c), None, None) for l, u, l_c, u_c in pairs]
+        dtype = np.float64 if self._base_ring is RDF else object
+        rows = np.empty((len(pairs), self._poly_ring.ngens() + 1), dtype=dtype)
+        start = 0
+        for lower, upper in blocks:
+            size = len(lower) * len(upper)
+            if size:
+                L = self._matrix_view([l for l, _ in lower])
+                U = self._matrix_view([u for u, _ in upper])
+                out = rows[start:start + size]
+                if self._base_ring is RDF:
+                    fm_combine(L, U, coordinate_index, out)
+                else:
+                    # out[i*len(upper) + j] is the combination of lower[i] and upper[j].
+                    view = out.reshape(len(lower), len(upper), rows.shape[1])
+                    np.multiply(L[:, None, :], U[None, :, coordinate_index, None], out=view)
+                    view -= U[None, :, :] * L[:, None, coordinate_index, None]
+                    view[:, :, coordinate_index] = 0
+            start += size
+        if self._base_ring is RDF:
+            keys = [tuple(key[-1:] + key[:-1]) for key in normalize_rows(rows).tolist()]
+        else:
+            keys = [None] * len(pairs)
+        return [(l, u, self._from_coeff_row(row[:-1], row[-1]), key, row) for (l, u, _, _), row, key in zip(pairs, rows, keys)]
+
+    def _substitute(self, polys, coordinate_index, sub):
+        r"""
+        Return the list of the polynomials ``p + p_c*(sub - x)`` for ``(p, p_c)``
+        in ``polys``, where ``x`` is the ``coordinate_index``-th generator,
+        ``p_c`` the coefficient of ``x`` in ``p``, and ``sub`` is a linear
+        polynomial to be substituted for ``x``.
+
+        The polynomials are returned as pairs ``(polynomial, row)``, where ``row``
+        is either ``None`` or the coefficient row of ``polynomial``.
+        The polynomials ``p`` with ``p_c == 0`` are passed through unchanged.
+
+        If the base ring is one of ``_dense_base_rings``, this is one update
+        ``M + c * v`` of the NumPy coefficient matrix ``M`` of the other polynomials,
+        where ``v`` is the coefficient vector of ``sub - x``.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q)
+            sage: p = y - 1
+            sage: result = bsa._substitute([(2*x + y, 2), (p, 0)], 0, 1 - y)
+            sage: [polynomial for polynomial, _ in result]
+            [-y + 2, y - 1]
+            sage: result[1][0] is p
+            True
+        """
+        zero = self._base_ring(0)
+        result = [(p, self._coeff_rows.get(p)) for p, _ in polys]
+        indices = [i for i, (_, c) in enumerate(polys) if c != zero]
+        if not indices:
+            return result
+        difference = sub - self._gens[coordinate_index]
+        if self._base_ring not in _dense_base_rings:
+            for i in indices:
+                p, c = polys[i]
+                result[i] = (p + c*difference, None)
+            return result
+        M = self._matrix_view([polys[i][0] for i in indices])
+        v = np.column_stack(self._to_coeff_matrix([difference]))[0]
+        c = np.array([polys[i][1] for i in indices], dtype=M.dtype)
+        M = M + c[:, None] * v[None, :]
+        M[:, coordinate_index] = 0
+        for i, row in zip(indices, M):
+            result[i] = (self._from_coeff_row(row[:-1], row[-1]), row)
+        return result
+
     def one_step_elimination(self, coordinate_index, bsa_class='linear_system'):
         r"""
         Compute the projection by eliminating ``coordinates``  as a new instance of
         ``BasicSemialgebraicSet_polyhedral_linear_system``.
+
+        Positive multiples of an inequality are not kept, and neither are inequalities
+        dominated by another one with the same linear part and a smaller history set::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: le = [x-y, -x, 2*y-3, y-1, -2*y]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=le)
+            sage: sorted(bsa.one_step_elimination(0).le_poly())
+            [-2*y, y - 1, 2*y - 3]
+            sage: history_set = {x-y: {1}, -x: {2}, 2*y-3: {3, 4}, y-1: {4}, -2*y: {5}}
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=le, history_set=history_set)
+            sage: sorted(bsa.one_step_elimination(0).le_poly())
+            [-2*y, y - 1]
+
+        The 5-dimensional cross polytope has 32 facets.  Eliminating a coordinate
+        gives `16 \cdot 16 = 256` Fourier-Motzkin combinations, many of which are
+        positive multiples of each other or have a non-minimal history set::
+
+            sage: from itertools import product
+            sage: S = PolynomialRing(QQ, 'y', 5)
+            sage: cross = [sum(e*v for e, v in zip(signs, S.gens())) - 1 for signs in product([1, -1], repeat=5)]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=S, le=cross)
+            sage: len(bsa.one_step_elimination(0).le_poly())
+            80
+            sage: len(bsa.coordinate_projection(S.gens()[:2]).le_poly())
+            68
+
+        Over ``ZZ``, which is not one of ``_dense_base_rings``, a substitution
+        that needs rational coefficients is rejected::
+
+            sage: Z.<x,y> = ZZ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Z, eq=[2*x-y], le=[x-1, -y])
+            sage: bsa.one_step_elimination(0)
+            Traceback (most recent call last):
+            ...
+            ValueError: not a proper poly_ring.
+
+        An inequality is not kept together with the same strict inequality,
+        which implies it::
+
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=[y-1, -x-1/2], lt=[y-1, x+y])
+            sage: bsa.le_poly()
+            {-x - 1/2}
+            sage: r = bsa.one_step_elimination(0)
+            sage: sorted(r.le_poly()), sorted(r.lt_poly())
+            ([], [y - 1, y - 1/2])
+            sage: sorted(r.history_set.items())
+            [(y - 1, {1}), (y - 1/2, {2, 3})]
         """
         # create a new poly_ring with one less generator (coordinate).
         if coordinate_index >= self._poly_ring.ngens():
             raise ValueError("doesn't exist the elimination variable")
-        coordinate = self._poly_ring.gens()[coordinate_index]
-        variables_names = [str(self._poly_ring.gens()[i]) for i in range(self._poly_ring.ngens()) if i != coordinate_index]
+        coordinate = self._gens[coordinate_index]
+        variables_names = [str(self._gens[i]) for i in range(len(self._gens)) if i != coordinate_index]
         new_poly_ring = PolynomialRing(self._base_ring, variables_names, len(variables_names))
         # create the ring hommorphism
         polynomial_map = [new_poly_ring.gens()[i] for i in range(new_poly_ring.ngens())]
         polynomial_map.insert(coordinate_index,new_poly_ring(0))
         
         new_eq=[]
-        new_lt=[]
-        new_le=[]
+        # history sets of the new equations.
         new_history_set={}
+        # new (strict) inequalities, as lists of triples (normalized constant term, polynomial,
+        # history set), so that a polynomial occurring in several families keeps its history set in each.
+        # Over the dense base rings, they are keyed by the normalized linear part,
+        # so that an inequality a*x + c (<)<= 0 is dominated by a*x + c' (<)<= 0 if c' > c.
+        # Otherwise, they are keyed by the full ``_normalize_linear`` tuple.
+        # A dominated inequality is only dropped if its history set contains the one of the
+        # dominating inequality, so that remove_redundancy_non_minimal_history_set stays valid.
+        new_lt={}
+        new_le={}
+        history_set_is_exact = self._history_set_is_exact
+        # coefficient rows and ``_normalize_linear`` keys of the new polynomials,
+        # passed to the projection.
+        new_rows={}
+        new_eq_keys={}
+        dense = self._base_ring in _dense_base_rings
+        # the keys of the polynomials of self.
+        known_keys = dict((p, key) for family in (self._eq, self._lt, self._le) for key, p in family.items()) if dense else {}
+
+        def normalized_key(polynomial, row):
+            key = known_keys.get(polynomial)
+            if key is not None:
+                return key
+            if row is not None:
+                return self._normalize_row(row)
+            return self._normalize_linear(polynomial)
+
+        def add_inequality(new_ineqs, polynomial, history, strict, key=None, row=None):
+            # drop constant inequalities that trivially hold.
+            if polynomial.is_constant():
+                value = self._base_ring(polynomial)
+                if (strict and value < 0) or (not strict and value <= 0):
+                    return
+            if key is None:
+                key = normalized_key(polynomial, row)
+            if dense:
+                cst, key = key[0], key[1:]
+            else:
+                cst = None
+            entries = new_ineqs.setdefault(key, [])
+            for old_cst, _, old_history in entries:
+                if cst == old_cst:
+                    # same inequality up to a positive multiple, prefer a smaller history set.
+                    if not history < old_history:
+                        return
+                elif cst < old_cst and old_history <= history:
+                    # dominated by an existing inequality with a smaller history set.
+                    return
+            # replace the existing inequalities of this kind with a larger history set.
+            entries[:] = [e for e in entries if not ((e[0] == cst or e[0] < cst) and history <= e[2])]
+            entries.append((cst, polynomial, history))
+            if row is not None:
+                new_rows[polynomial] = row
+
         # try to find a substitution of coordinate in equalities.
         sub=None
-        for e in self._eq:
-            if e.monomial_coefficient(coordinate) != self.base_ring()(0):
-                sub = coordinate - e/e.monomial_coefficient(coordinate)
+        for e in self._eq.values():
+            c = e.monomial_coefficient(coordinate)
+            if c != self.base_ring()(0):
+                sub = coordinate - e/c
                 sub_history=self.history_set[e]
                 break
         if sub is None:
-            new_eq=self._eq
-            for e in self._eq:
+            new_eq=list(self._eq.values())
+            for e in new_eq:
                 new_history_set[e]=self.history_set[e]
+                if dense:
+                    new_eq_keys[e]=known_keys[e]
             
-            lt_lower=[]
-            lt_upper=[]
-            le_lower=[]
-            le_upper=[]
-            
-            for lt in self._lt:
-                if self._base_ring(lt.monomial_coefficient(coordinate))>self.base_ring()(0):
-                    lt_upper.append(lt)
-                elif self._base_ring(lt.monomial_coefficient(coordinate))<self.base_ring()(0):
-                    lt_lower.append(lt)
-                else:
-                    new_lt.append(lt)
-                    new_history_set[lt]=self.history_set[lt]
-            for le in self._le:
-                if self._base_ring(le.monomial_coefficient(coordinate))>self.base_ring()(0):
-                    le_upper.append(le)
-                elif self._base_ring(le.monomial_coefficient(coordinate))<self.base_ring()(0):
-                    le_lower.append(le)
-                else:
-                    new_le.append(le)
-                    new_history_set[le]=self.history_set[le]
+            def bucket(polys):
+                # split polys into the lists of pairs (polynomial, coefficient of coordinate)
+                # with a negative and a positive coefficient, and the list of pairs
+                # (polynomial, coefficient row or None) without coordinate.
+                polys = list(polys)
+                if dense:
+                    M = self._matrix_view(polys)
+                    column = M[:, coordinate_index]
+                    lower = [(polys[i], column[i]) for i in np.flatnonzero(column < 0)]
+                    upper = [(polys[i], column[i]) for i in np.flatnonzero(column > 0)]
+                    others = [(polys[i], M[i]) for i in np.flatnonzero(column == 0)]
+                    return lower, upper, others
+                lower = []
+                upper = []
+                others = []
+                zero = self._base_ring(0)
+                for p in polys:
+                    c = self._base_ring(p.monomial_coefficient(coordinate))
+                    if c > zero:
+                        upper.append((p, c))
+                    elif c < zero:
+                        lower.append((p, c))
+                    else:
+                        others.append((p, None))
+                return lower, upper, others
+
+            lt_lower, lt_upper, lt_others = bucket(self._lt.values())
+            le_lower, le_upper, le_others = bucket(self._le.values())
+            for lt, row in lt_others:
+                add_inequality(new_lt, lt, self.history_set[lt], True, row=row)
+            for le, row in le_others:
+                add_inequality(new_le, le, self.history_set[le], False, row=row)
 
             # compute less than or equal to inequality
-            for l in le_lower:
-                for u in le_upper:
-                    polynomial=l*u.monomial_coefficient(coordinate)-(u*l.monomial_coefficient(coordinate))
-                    new_le.append(polynomial)
-                    new_history_set[polynomial]=self.history_set[l].union(self.history_set[u])
+            for l, u, polynomial, key, row in self._fm_combine([(le_lower, le_upper)], coordinate_index):
+                add_inequality(new_le, polynomial, self.history_set[l].union(self.history_set[u]), False, key, row)
 
             # compute strictly less than inequality
-            for l in le_lower:
-                for u in lt_upper:
-                    polynomial=l*u.monomial_coefficient(coordinate)-(u*l.monomial_coefficient(coordinate))
-                    new_lt.append(polynomial)
-                    new_history_set[polynomial]=self.history_set[l].union(self.history_set[u])
-            for l in lt_lower:
-                for u in le_upper:
-                    polynomial=l*u.monomial_coefficient(coordinate)-(u*l.monomial_coefficient(coordinate))
-                    new_lt.append(polynomial)
-                    new_history_set[polynomial]=self.history_set[l].union(self.history_set[u])
-            for l in lt_lower:
-                for u in lt_upper:
-                    polynomial=l*u.monomial_coefficient(coordinate)-(u*l.monomial_coefficient(coordinate))
-                    new_lt.append(polynomial)
-                    new_history_set[polynomial]=self.history_set[l].union(self.history_set[u])
+            for l, u, polynomial, key, row in self._fm_combine([(le_lower, lt_upper), (lt_lower, le_upper), (lt_lower, lt_upper)], coordinate_index):
+                add_inequality(new_lt, polynomial, self.history_set[l].union(self.history_set[u]), True, key, row)
         else:
-            for e in self._eq:
-                polynomial=e+e.monomial_coefficient(coordinate)*(sub-coordinate)
+            eq_pairs = [(e, e.monomial_coefficient(coordinate)) for e in self._eq.values()]
+            lt_pairs = [(lt, lt.monomial_coefficient(coordinate)) for lt in self._lt.values()]
+            le_pairs = [(le, le.monomial_coefficient(coordinate)) for le in self._le.values()]
+            for (e, c), (polynomial, row) in zip(eq_pairs, self._substitute(eq_pairs, coordinate_index, sub)):
                 new_eq.append(polynomial)
-                if e.monomial_coefficient(coordinate) != self.base_ring()(0):
+                if row is not None:
+                    new_rows[polynomial] = row
+                if dense:
+                    new_eq_keys[polynomial] = normalized_key(polynomial, row)
+                if c != self.base_ring()(0):
                     new_history_set[polynomial]=self.history_set[e].union(sub_history)
                 else:
                     new_history_set[polynomial]=self.history_set[e]
-            for lt in self._lt:
-                polynomial=lt+lt.monomial_coefficient(coordinate)*(sub-coordinate)
-                new_lt.append(polynomial)
-                if lt.monomial_coefficient(coordinate) != self.base_ring()(0):
-                    new_history_set[polynomial]=self.history_set[lt].union(sub_history)
+            for (lt, c), (polynomial, row) in zip(lt_pairs, self._substitute(lt_pairs, coordinate_index, sub)):
+                if c != self.base_ring()(0):
+                    add_inequality(new_lt, polynomial, self.history_set[lt].union(sub_history), True, row=row)
                 else:
-                    new_history_set[polynomial]=self.history_set[lt]
-            for le in self._le:
-                polynomial=le+le.monomial_coefficient(coordinate)*(sub-coordinate)
-                new_le.append(polynomial)
-                if le.monomial_coefficient(coordinate) != self.base_ring()(0):
-                    new_history_set[polynomial]=self.history_set[le].union(sub_history)
+                    add_inequality(new_lt, polynomial, self.history_set[lt], True, row=row)
+            for (le, c), (polynomial, row) in zip(le_pairs, self._substitute(le_pairs, coordinate_index, sub)):
+                if c != self.base_ring()(0):
+                    add_inequality(new_le, polynomial, self.history_set[le].union(sub_history), False, row=row)
                 else:
-                    new_history_set[polynomial]=self.history_set[le]
+                    add_inequality(new_le, polynomial, self.history_set[le], False, row=row)
 
-        bsa = BasicSemialgebraicSet_polyhedral_linear_system(base_ring=self._base_ring, ambient_dim=self.ambient_dim(), poly_ring=self._poly_ring, eq=new_eq, lt=new_lt, le=new_le, history_set=new_history_set)
-        new_bsa = bsa.section(polynomial_map,bsa_class=bsa_class,poly_ring=new_poly_ring,history_set=new_history_set)
+        # map the new polynomials down to new_poly_ring, together with their
+        # coefficient rows and keys, from which the entry of coordinate (which is zero) is dropped.
         down_stair_history_set={}
-        for key in new_bsa.history_set.keys():
-            down_stair_history_set[key(polynomial_map)]=new_bsa.history_set[key]
-        new_bsa.history_set=down_stair_history_set
+        families=[]
+        matrices=[]
+        keys=[]
+        for non_strict, family in ((False, [(p, new_history_set[p], new_eq_keys.get(p)) for p in new_eq]),
+                                   (False, [(p, h, (cst,) + key if dense else None) for key, entries in new_lt.items() for cst, p, h in entries]),
+                                   (True, [(p, h, (cst,) + key if dense else None) for key, entries in new_le.items() for cst, p, h in entries])):
+            down_polys=[]
+            down_rows=[]
+            down_keys=[]
+            for p, history, key in family:
+                q = p(polynomial_map)
+                if non_strict and q in down_stair_history_set:
+                    # implied by the same equation or strict inequality.
+                    continue
+                down_polys.append(q)
+                row = new_rows.get(p)
+                down_rows.append(np.delete(row, coordinate_index) if row is not None else None)
+                down_keys.append(key[:coordinate_index + 1] + key[coordinate_index + 2:] if key is not None else None)
+                # a polynomial in several families keeps the history set of the first one.
+                if down_stair_history_set.setdefault(q, history) != history:
+                    history_set_is_exact = False
+            families.append(down_polys)
+            matrices.append(down_rows)
+            keys.append(down_keys)
+        new_bsa = BasicSemialgebraicSet_polyhedral_linear_system(base_ring=self._base_ring, poly_ring=new_poly_ring, eq=families[0], lt=families[1], le=families[2], history_set=down_stair_history_set, _precomputed_matrices=matrices, _precomputed_keys=keys)
+        new_bsa._history_set_is_exact = new_bsa._history_set_is_exact and history_set_is_exact
         # remove constant polynomial
         new_bsa.remove_redundant_constant_polynomial()
         # remove polynomial with non_minimal_history_set
-        new_bsa.remove_redundancy_non_minimal_history_set()
+        if new_bsa._history_set_is_exact:
+            new_bsa.remove_redundancy_non_minimal_history_set()
+        if bsa_class != 'linear_system':
+            return _bsa_class(bsa_class).from_bsa(new_bsa)
         return new_bsa
 
-    def coordinate_projection(self, coordinates, bsa_class='linear_system'):
+    def _elimination_costs(self, coordinate_indices):
+        r"""
+        Return a dictionary mapping each index in ``coordinate_indices`` to a sort key
+        estimating the cost of ``one_step_elimination`` of this coordinate.
+
+        The key is ``(0, 0)`` if the coordinate can be substituted using an equation.
+        Otherwise it is ``(1 + n_lower * n_upper, -n_zero)``, where ``n_lower``, ``n_upper``
+        and ``n_zero`` are the numbers of (strict) inequalities in which the coefficient
+        of the coordinate is negative, positive, and zero.
+
+        The sign tests are done off the record if the base ring supports it (such as
+        ``ParametricRealField``), so that no assumptions are recorded.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y,z> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, eq=[z-x], le=[x-1, -x, y-x, y+x-2, -y])
+            sage: bsa._elimination_costs([0, 1, 2])
+            {0: (0, 0), 1: (3, -2), 2: (0, 0)}
+        """
+        gens = self._gens
+        zero = self._base_ring(0)
+
+        def costs():
+            counts = dict((i, [0, 0, 0]) for i in coordinate_indices)
+            for p in chain(self._lt.values(), self._le.values()):
+                for i, count in counts.items():
+                    c = self._base_ring(p.monomial_coefficient(gens[i]))
+                    if c > zero:
+                        count[0] += 1
+                    elif c < zero:
+                        count[1] += 1
+                    else:
+                        count[2] += 1
+            result = {}
+            for i, (n_upper, n_lower, n_zero) in counts.items():
+                if any(e.monomial_coefficient(gens[i]) != zero for e in self._eq.values()):
+                    result[i] = (0, 0)
+                else:
+                    result[i] = (1 + n_lower * n_upper, -n_zero)
+            return result
+
+        try:
+            off_the_record = self._base_ring.off_the_record
+        except AttributeError:
+            return costs()
+        with off_the_record():
+            return costs()
+
+    def coordinate_projection(self, coordinates, bsa_class='linear_system', strategy='input_order'):
         r"""
         Compute the projection after projecting out the ``coordinates`` (a list or tuple of
         indices or variables of ``self.poly_ring``) as a new instance of
         ``BasicSemialgebraicSet_polyhedral_linear_system`` or the given ``bsa_class``.
+
+        The coordinates are eliminated one at a time. With ``strategy='input_order'`` (the
+        default), they are eliminated in the given order. With ``strategy='greedy'``, the next
+        one is a coordinate of smallest ``_elimination_costs``, i.e., with the fewest
+        Fourier-Motzkin combinations, preferring coordinates that can be substituted using an
+        equation.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y,z> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, le=[x-1, -x, y-x, -y-x, z-y, -z-y, -z+2*x])
+            sage: bsa_greedy = bsa.coordinate_projection([x, y], strategy='greedy')
+            sage: bsa_input_order = bsa.coordinate_projection([x, y], strategy='input_order')
+            sage: bsa_greedy.to_polyhedron() == bsa_input_order.to_polyhedron()
+            True
+            sage: bsa.coordinate_projection([y, x, y], strategy='input_order').to_polyhedron() == bsa_input_order.to_polyhedron()
+            True
         """
         res=self
         for c in coordinates:
-            if not c in self._poly_ring.gens():
+            if not c in self._gens_index:
                 raise ValueError("Coordinate not found in the polynomial ring")
-        elimination_positions=[self._poly_ring.gens().index(c) for c in coordinates]
-        for i in range(len(elimination_positions)):
-            coordinate_index=elimination_positions[i]
-            res = res.one_step_elimination(coordinate_index)
-            # update indices
-            for j in range(i+1,len(elimination_positions)):
-                if elimination_positions[j]>coordinate_index:
-                    elimination_positions[j]-=1
+        # eliminated coordinates are identified by name, since the indices shift after each step;
+        # repeated coordinates are eliminated once.
+        names = list(dict.fromkeys(str(c) for c in coordinates))
+        if strategy == 'greedy':
+            while len(names) > 1:
+                variable_names = res._poly_ring.variable_names()
+                costs = res._elimination_costs([variable_names.index(name) for name in names])
+                coordinate_index = min(costs, key=costs.get)
+                names.remove(variable_names[coordinate_index])
+                res = res.one_step_elimination(coordinate_index)
+        elif strategy != 'input_order':
+            raise ValueError("unknown strategy: {}".format(strategy))
+        for name in names:
+            res = res.one_step_elimination(res._poly_ring.variable_names().index(name))
         return res
     
     def poly_ring(self):
@@ -319,7 +908,7 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
         
         Together, ``eq_poly``, ``lt_poly``, and ``le_poly`` describe ``self``.
         """
-        return self._eq
+        return set(self._eq.values())
 
     def lt_poly(self):
         r"""
@@ -328,7 +917,7 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
             
         Together, ``eq_poly``, ``lt_poly``, and ``le_poly`` describe ``self``.
         """
-        return self._lt
+        return set(self._lt.values())
 
     def le_poly(self):
         r"""
@@ -337,7 +926,7 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
         
         Together, ``eq_poly``, ``lt_poly``, and ``le_poly`` describe ``self``.
         """
-        return self._le
+        return set(self._le.values())
 
     def add_polynomial_constraint(self, lhs, op):
         """
@@ -353,18 +942,13 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
                 raise TypeError("can not convert lhs into self.poly_ring")
         if lhs.degree() > 1:
             raise ValueError("{} is not a valid linear polynomial.".format(lhs))
-        if op == operator.lt:
-            self._lt.add(lhs)
-        elif op == operator.gt:
-            self._lt.add(-lhs)
-        elif op == operator.eq:
-            self._eq.add(lhs)
-        elif op == operator.le:
-            self._le.add(lhs)
-        elif op == operator.ge:
-            self._le.add(-lhs)
-        else:
+        try:
+            attribute, sign = _op_to_set[op]
+        except KeyError:
             raise ValueError("{} is not a supported operator".format(op))
+        if sign < 0:
+            lhs = -lhs
+        getattr(self, attribute).setdefault(self._constraint_key(lhs), lhs)
 
     def add_linear_constraint(self, lhs_vector, cst, op):
         """
@@ -375,20 +959,61 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
         """
         if len(lhs_vector) != self._ambient_dim:
             raise ValueError("length of lhs_vector and ambient_dim do not match.")
-        lhs=sum(lhs_vector[i]*self.poly_ring().gens()[i] for i in range(len(lhs_vector)))+cst
+        lhs=sum(lhs_vector[i]*self._gens[i] for i in range(len(lhs_vector)))+cst
         self.add_polynomial_constraint(lhs, op)
 
+    def _add_linear_fast(self, lhs_vector, cst, op):
+        r"""
+        Add the constraint ``lhs`` * x + cst ``op`` 0 like ``add_linear_constraint``,
+        but without checking the length of ``lhs_vector``, the parent and the degree.
+
+        Return the polynomial that is stored in ``eq_poly()``, ``lt_poly()`` or ``le_poly()``;
+        this is an earlier positive multiple of the constraint, if there is one.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q)
+            sage: bsa._add_linear_fast([1, -2], 3, operator.ge)
+            -x + 2*y - 3
+            sage: bsa.le_poly()
+            {-x + 2*y - 3}
+        """
+        attribute, sign = _op_to_set[op]
+        lhs = self._from_coefficient_list([sign*c for c in chain((cst,), lhs_vector)])
+        return getattr(self, attribute).setdefault(self._constraint_key(lhs), lhs)
+
     def to_polyhedron(self, **kwds):
+        r"""
+        Return the ``Polyhedron`` defined by ``self``, which must not have strict inequalities.
+
+        EXAMPLES::
+
+            sage: from cutgeneratingfunctionology.spam.basic_semialgebraic_linear_system import *
+            sage: Q.<x,y> = QQ[]
+            sage: bsa = BasicSemialgebraicSet_polyhedral_linear_system(poly_ring=Q, eq=[x-y], le=[x-1, -x])
+            sage: sorted(bsa.to_polyhedron().vertices_list())
+            [[0, 0], [1, 1]]
+            sage: bsa.add_polynomial_constraint(y, operator.lt)
+            sage: bsa.to_polyhedron()
+            Traceback (most recent call last):
+            ...
+            ValueError: Contain strict inequalities.
+        """
         # not suitable for Paramatric field
         if len(self._lt)>0:
             raise ValueError("Contain strict inequalities.")
-        ieqs=[]
-        eqns=[]
-        for le in self._le:
-            temp_le = [le.constant_coefficient()] + [le.monomial_coefficient(v) for v in self.poly_ring().gens()]
-            ieqs.append([-x for x in temp_le])
-        for eq in self._eq:
-            eqns.append([eq.constant_coefficient()] + [eq.monomial_coefficient(v) for v in self.poly_ring().gens()])
+
+        def coefficient_matrix(polys):
+            # the matrix of the rows [const, c0, c1, ...] of polys.
+            polys = list(polys)
+            if self._base_ring in _dense_base_rings:
+                return np.roll(self._matrix_view(polys), 1, axis=1)
+            return np.array(self._coefficient_lists(polys), dtype=object).reshape(len(polys), len(self._gens) + 1)
+
+        ieqs = (-coefficient_matrix(self._le.values())).tolist()
+        eqns = coefficient_matrix(self._eq.values()).tolist()
         return Polyhedron(ieqs=ieqs, eqns=eqns, **kwds)
 
     @classmethod
@@ -408,12 +1033,10 @@ class BasicSemialgebraicSet_polyhedral_linear_system(BasicSemialgebraicSet_polyh
         self = cls(base_ring=base_ring, ambient_dim=ambient_dim, poly_ring=poly_ring)
         i=1
         for lhs in p.inequalities_list():
-            self.add_linear_constraint(lhs[1:],lhs[0],operator.ge)
-            self.history_set[-sum(lhs[1:][i]*self.poly_ring().gens()[i] for i in range(len(lhs)-1))-lhs[0]]={i}
+            self.history_set[self._add_linear_fast(lhs[1:],lhs[0],operator.ge)]={i}
             i+=1
         for lhs in p.equations_list():
-            self.add_linear_constraint(lhs[1:],lhs[0],operator.eq)
-            self.history_set[sum(lhs[1:][i]*self.poly_ring().gens()[i] for i in range(len(lhs)-1))+lhs[0]]={i}
+            self.history_set[self._add_linear_fast(lhs[1:],lhs[0],operator.eq)]={i}
             i+=1
         return self
 